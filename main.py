@@ -1,17 +1,64 @@
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import multiprocessing
 import os
-from fastapi import FastAPI, HTTPException, Depends, status
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from fastapi import FastAPI, HTTPException, Depends, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from authlib.jose import jwt, JsonWebKey
+from cachetools import TTLCache
 from dotenv import load_dotenv
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
 from functools import lru_cache
-import jwt as pyjwt
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import Optional
 
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Optional process pool for token signature verification (off by default: per-token
+# verification is cheaper in-process than the IPC round trip to a worker)
+VERIFY_POOL_WORKERS = int(os.getenv("VERIFY_POOL_WORKERS", "0"))
+_VERIFY_POOL: Optional[ProcessPoolExecutor] = None
+
+
+def _new_verify_pool() -> ProcessPoolExecutor:
+    """Create the token verification process pool"""
+    return ProcessPoolExecutor(
+        max_workers=VERIFY_POOL_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Run the token verification process pool for the app's lifetime"""
+    global _VERIFY_POOL
+    if VERIFY_POOL_WORKERS > 0:
+        _VERIFY_POOL = _new_verify_pool()
+    try:
+        await _warm_up()
+        yield
+    finally:
+        if _VERIFY_POOL is not None:
+            _VERIFY_POOL.shutdown(cancel_futures=True)
+            _VERIFY_POOL = None
+
+
 # FastAPI app instance
 app = FastAPI(
     title="Python Auth Backend",
@@ -19,30 +66,40 @@ app = FastAPI(
     version="1.0.0",
     docs_url="/docs",  # Swagger UI at /docs
     redoc_url="/redoc",  # ReDoc at /redoc
+    default_response_class=ORJSONResponse,  # Faster JSON serialization via orjson
+    lifespan=lifespan,
 )
 
 # HTTP Bearer token security
 security = HTTPBearer()
 
 
-# Pydantic models for responses
+# Pydantic models for responses (immutable once built)
 class HealthResponse(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     status: str
     service: str
 
 
 class User(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     name: str
     email: str
 
 
 class HelloWorldResponse(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     message: str
     user: User
     authenticated: bool
 
 
 class AuthInfoResponse(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     tenant_id: str
     client_id: str
     auth_url: str
@@ -51,31 +108,235 @@ class AuthInfoResponse(BaseModel):
 
 
 class ErrorResponse(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     error: str
 
 
-@lru_cache()
-def get_settings():
+# Environment settings with all Azure AD URLs precomputed
+@dataclass(frozen=True, slots=True)
+class Settings:
+    tenant_id: Optional[str]
+    client_id: Optional[str]
+    jwks_url: str
+    issuer_v1: str
+    issuer_v2: str
+    valid_issuers: frozenset[str]
+    auth_url: str
+    token_url: str
+
+
+# Authenticated user extracted from validated token claims
+@dataclass(frozen=True, slots=True)
+class AuthUser:
+    name: str
+    email: str
+    claims: dict
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
     """Get cached environment settings"""
+    tenant_id = os.getenv("AZURE_TENANT_ID")
+    authority = f"https://login.microsoftonline.com/{tenant_id}"
+    # Support both v1.0 and v2.0 token issuers
+    issuer_v1 = f"https://sts.windows.net/{tenant_id}/"
+    issuer_v2 = f"{authority}/v2.0"
+
+    return Settings(
+        tenant_id=tenant_id,
+        client_id=os.getenv("AZURE_CLIENT_ID"),
+        jwks_url=f"{authority}/discovery/v2.0/keys",
+        issuer_v1=issuer_v1,
+        issuer_v2=issuer_v2,
+        valid_issuers=frozenset({issuer_v1, issuer_v2}),
+        auth_url=f"{authority}/oauth2/v2.0/authorize",
+        token_url=f"{authority}/oauth2/v2.0/token",
+    )
+
+
+# Shared HTTP session so JWKS refreshes reuse pooled keep-alive connections
+JWKS_FETCH_TIMEOUT = 2.0  # seconds
+_HTTP = requests.Session()
+_HTTP.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+
+# Cache of Microsoft signing keys per tenant: tenant_id -> (fetched_at, {kid: jwk})
+JWKS_CACHE_TTL = 3600  # seconds
+JWKS_MIN_REFRESH_INTERVAL = 60  # seconds between forced refreshes on unknown kid
+_JWKS_CACHE: dict[str, tuple[float, dict]] = {}
+_JWKS_LOCKS: dict[str, asyncio.Lock] = {}
+
+
+def _fetch_jwks_keys(jwks_url: str) -> dict:
+    """Fetch Microsoft's public keys (blocking, run in a threadpool)"""
+    logger.debug("🔍 Fetching JWKS from %s", jwks_url)
+
+    # Fetch the public keys from Microsoft
+    response = _HTTP.get(jwks_url, timeout=JWKS_FETCH_TIMEOUT)
+    response.raise_for_status()
+    jwks = response.json()
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("🔍 Found %d keys in JWKS", len(jwks.get("keys", [])))
+
+    # Index signing keys by kid so lookups are O(1)
     return {
-        "tenant_id": os.getenv("AZURE_TENANT_ID"),
-        "client_id": os.getenv("AZURE_CLIENT_ID"),
+        jwk["kid"]: jwk
+        for jwk in jwks["keys"]
+        if "kid" in jwk and jwk.get("use", "sig") == "sig"
     }
 
 
+def _cached_jwks_keys(tenant_id: str, force_refresh: bool) -> Optional[dict]:
+    """Return the tenant's cached keys if they are still fresh"""
+    cached = _JWKS_CACHE.get(tenant_id)
+    if cached:
+        age = time.monotonic() - cached[0]
+        if age < JWKS_CACHE_TTL and not (
+            force_refresh and age >= JWKS_MIN_REFRESH_INTERVAL
+        ):
+            return cached[1]
+    return None
+
+
+async def get_jwks_keys(settings: Settings, force_refresh: bool = False) -> dict:
+    """Get Microsoft's public keys for the tenant, indexed by key ID"""
+    keys = _cached_jwks_keys(settings.tenant_id, force_refresh)
+    if keys is not None:
+        return keys
+
+    # Only one refresh per tenant at a time; concurrent callers wait and reuse it
+    async with _JWKS_LOCKS.setdefault(settings.tenant_id, asyncio.Lock()):
+        keys = _cached_jwks_keys(settings.tenant_id, force_refresh)
+        if keys is not None:
+            return keys
+
+        keys = await run_in_threadpool(_fetch_jwks_keys, settings.jwks_url)
+        _JWKS_CACHE[settings.tenant_id] = (time.monotonic(), keys)
+        return keys
+
+
+# Imported keys, cached separately in each process: kid -> (jwk, key)
+_IMPORTED_KEYS: dict[str, tuple[dict, JsonWebKey]] = {}
+
+
+def _import_key(kid: str, jwk: dict) -> JsonWebKey:
+    """Import a JWK once per process, re-importing if the kid's key changed"""
+    cached = _IMPORTED_KEYS.get(kid)
+    if cached is None or cached[0] != jwk:
+        cached = (jwk, JsonWebKey.import_key(jwk))
+        _IMPORTED_KEYS[kid] = cached
+    return cached[1]
+
+
+def _import_keys(keys: dict) -> None:
+    """Import all of a tenant's JWKs ahead of the first request"""
+    for kid, jwk in keys.items():
+        try:
+            _import_key(kid, jwk)
+        except Exception as e:
+            # Only tokens signed with this kid will fail; keep warming the rest
+            logger.warning("⚠️ Could not import JWKS key %s: %s", kid, e)
+
+
+def _decode_token(token: str, kid: str, jwk: dict) -> dict:
+    """Verify the token signature and decode its claims (runs in the verify pool)"""
+    return dict(jwt.decode(token, _import_key(kid, jwk)))
+
+
+async def _verify_token(token: str, kid: str, jwk: dict) -> dict:
+    """Verify and decode the token off the event loop (RSA verify is CPU-bound)"""
+    global _VERIFY_POOL
+    pool = _VERIFY_POOL
+    if pool is not None:
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                pool, _decode_token, token, kid, jwk
+            )
+        except BrokenProcessPool:
+            # A worker died; replace the pool once and verify this token in a thread
+            logger.warning("⚠️ Token verification pool broke, restarting it")
+            if _VERIFY_POOL is pool:
+                _VERIFY_POOL = _new_verify_pool()
+                pool.shutdown(wait=False, cancel_futures=True)
+    return await run_in_threadpool(_decode_token, token, kid, jwk)
+
+
+async def _warm_up() -> None:
+    """Prefetch JWKS and start the verify workers so the first request is not slow"""
+    settings = get_settings()
+    keys: dict = {}
+    if settings.tenant_id:
+        try:
+            keys = await get_jwks_keys(settings)
+        except Exception as e:
+            logger.warning("⚠️ Could not prefetch JWKS: %s", e)
+
+    if _VERIFY_POOL is None:
+        _import_keys(keys)
+        return
+
+    # Each submission spawns a worker until the pool is full; workers import keys
+    loop = asyncio.get_running_loop()
+    try:
+        await asyncio.gather(
+            *(
+                loop.run_in_executor(_VERIFY_POOL, _import_keys, keys)
+                for _ in range(VERIFY_POOL_WORKERS)
+            )
+        )
+    except Exception as e:
+        logger.warning("⚠️ Could not warm up token verification pool: %s", e)
+
+
+def _get_unverified_header(header_b64: str) -> Optional[dict]:
+    """Decode the JWT header without verifying the signature"""
+    header_b64 += "=" * (-len(header_b64) % 4)
+    try:
+        header = json.loads(base64.urlsafe_b64decode(header_b64))
+    except ValueError:
+        return None
+    return header if isinstance(header, dict) else None
+
+
+# Token validation limits and cache of validated tokens: sha256(token) -> user
+MAX_TOKEN_HEADER_LENGTH = 4096  # bytes of base64url-encoded JWT header
+TOKEN_EXPIRY_SKEW = 30  # seconds before exp at which cached tokens are re-validated
+_TOKEN_CACHE: TTLCache = TTLCache(maxsize=10_000, ttl=300)
+_TOKEN_CACHE_LOCK = threading.Lock()
+
+
 async def validate_microsoft_token(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-) -> dict:
+) -> AuthUser:
     """Dependency to validate Microsoft JWT token"""
     token = credentials.credentials
+
+    # Cheaply reject malformed tokens before hashing, key lookups or network calls
+    parts = token.split(".")
+    if len(parts) != 3 or len(parts[0]) > MAX_TOKEN_HEADER_LENGTH:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Malformed token"
+        )
+
+    # Skip signature verification for tokens we have already validated
+    token_hash = hashlib.sha256(token.encode()).digest()
+    with _TOKEN_CACHE_LOCK:
+        cached_user = _TOKEN_CACHE.get(token_hash)
+    if (
+        cached_user
+        and cached_user.claims.get("exp", 0) > time.time() + TOKEN_EXPIRY_SKEW
+    ):
+        return cached_user
+
     settings = get_settings()
 
     try:
         # Get tenant and client info
-        tenant_id = settings["tenant_id"]
-        client_id = settings["client_id"]
+        tenant_id = settings.tenant_id
+        client_id = settings.client_id
 
-        print(f"🔍 Debug: tenant_id={tenant_id}, client_id={client_id}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("🔍 tenant_id=%s, client_id=%s", tenant_id, client_id)
 
         if not tenant_id or not client_id:
             raise HTTPException(
@@ -83,56 +344,57 @@ async def validate_microsoft_token(
                 detail="Azure configuration missing",
             )
 
-        jwks_url = f"https://login.microsoftonline.com/{tenant_id}/discovery/v2.0/keys"
-        print(f"🔍 Debug: Fetching JWKS from {jwks_url}")
-
         # Get the JWT header to find the key ID
-        header = pyjwt.get_unverified_header(token)
-        print(f"🔍 Debug: JWT header: {header}")
-
-        # Fetch the public keys from Microsoft
-        response = requests.get(jwks_url)
-        response.raise_for_status()
-        jwks = response.json()
-        print(f"🔍 Debug: Found {len(jwks.get('keys', []))} keys in JWKS")
-
-        # Find the correct key
-        key = None
-        for jwk in jwks["keys"]:
-            if jwk["kid"] == header["kid"]:
-                key = JsonWebKey.import_key(jwk)
-                print(f"🔍 Debug: Found matching key for kid: {header['kid']}")
-                break
-
-        if not key:
-            print(f"❌ Debug: No key found for kid: {header['kid']}")
+        header = _get_unverified_header(parts[0])
+        if header is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED, detail="Malformed token"
+            )
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("🔍 JWT header: %s", header)
+
+        kid = header.get("kid")
+        if not kid:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token key"
             )
 
-        # Verify and decode the token
-        claims = jwt.decode(token, key)
-        print(f"🔍 Debug: Token decoded successfully")
-        print(f"🔍 Debug: Token claims: {claims}")
+        # Find the correct key, refreshing once in case Microsoft rotated keys
+        keys = await get_jwks_keys(settings)
+        jwk = keys.get(kid)
+        if not jwk:
+            keys = await get_jwks_keys(settings, force_refresh=True)
+            jwk = keys.get(kid)
+
+        if not jwk:
+            logger.debug("❌ No key found for kid: %s", kid)
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token key"
+            )
+        logger.debug("🔍 Found matching key for kid: %s", kid)
+
+        claims = await _verify_token(token, kid, jwk)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("🔍 Token decoded successfully")
+            logger.debug("🔍 Token claims: %s", claims)
 
         # Validate issuer and audience - support both v1.0 and v2.0 endpoints
-        expected_issuer_v1 = f"https://sts.windows.net/{tenant_id}/"
-        expected_issuer_v2 = f"https://login.microsoftonline.com/{tenant_id}/v2.0"
         token_issuer = claims.get("iss")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("🔍 Token issuer: %s", token_issuer)
+            logger.debug("🔍 Expected v1: %s", settings.issuer_v1)
+            logger.debug("🔍 Expected v2: %s", settings.issuer_v2)
 
-        print(f"🔍 Debug: Token issuer: {token_issuer}")
-        print(f"🔍 Debug: Expected v1: {expected_issuer_v1}")
-        print(f"🔍 Debug: Expected v2: {expected_issuer_v2}")
-
-        if token_issuer not in [expected_issuer_v1, expected_issuer_v2]:
+        if token_issuer not in settings.valid_issuers:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
-                detail=f"Invalid token issuer. Got: {token_issuer}, Expected: {expected_issuer_v1} or {expected_issuer_v2}",
+                detail=f"Invalid token issuer. Got: {token_issuer}, Expected: {settings.issuer_v1} or {settings.issuer_v2}",
             )
 
         token_audience = claims.get("aud")
-        print(f"🔍 Debug: Token audience: {token_audience}")
-        print(f"🔍 Debug: Expected audience: {client_id}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("🔍 Token audience: %s", token_audience)
+            logger.debug("🔍 Expected audience: %s", client_id)
 
         if token_audience != client_id:
             raise HTTPException(
@@ -140,28 +402,53 @@ async def validate_microsoft_token(
                 detail=f"Invalid token audience. Got: {token_audience}, Expected: {client_id}",
             )
 
-        print("✅ Debug: Token validation successful!")
-        return claims
+        logger.debug("✅ Token validation successful!")
+        user = AuthUser(
+            name=claims.get("name", "Unknown User"),
+            email=claims.get("email", "No email"),
+            claims=claims,
+        )
+        with _TOKEN_CACHE_LOCK:
+            _TOKEN_CACHE[token_hash] = user
+        return user
 
     except HTTPException:
         raise
+    except (requests.RequestException, BrokenProcessPool) as e:
+        # Our side failed (JWKS fetch or verify pool), not the client's token
+        logger.warning("❌ Exception during token validation: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Token validation temporarily unavailable",
+        )
     except Exception as e:
-        print(f"❌ Debug: Exception during token validation: {str(e)}")
+        logger.warning("❌ Exception during token validation: %s", e)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail=f"Token validation failed: {str(e)}",
         )
 
 
+# The health payload never changes, so serialize it once
+_HEALTH_BYTES = orjson.dumps(
+    HealthResponse(status="healthy", service="python-auth-backend").model_dump()
+)
+
+
 @app.get(
     "/api/health",
-    response_model=HealthResponse,
     summary="Health Check",
     description="Check if the API is running and healthy",
+    responses={
+        200: {
+            "model": HealthResponse,
+            "description": "The service is healthy",
+        }
+    },
 )
 async def health_check():
     """Health check endpoint that doesn't require authentication"""
-    return HealthResponse(status="healthy", service="python-auth-backend")
+    return Response(content=_HEALTH_BYTES, media_type="application/json")
 
 
 @app.get(
@@ -176,14 +463,11 @@ async def health_check():
         }
     },
 )
-async def hello_world(claims: dict = Depends(validate_microsoft_token)):
+async def hello_world(user: AuthUser = Depends(validate_microsoft_token)):
     """Hello World API that requires valid Microsoft token"""
-    user_name = claims.get("name", "Unknown User")
-    user_email = claims.get("email", "No email")
-
     return HelloWorldResponse(
         message="Hello, World!",
-        user=User(name=user_name, email=user_email),
+        user=User(name=user.name, email=user.email),
         authenticated=True,
     )
 
@@ -197,14 +481,12 @@ async def hello_world(claims: dict = Depends(validate_microsoft_token)):
 async def auth_info():
     """Get authentication configuration info"""
     settings = get_settings()
-    tenant_id = settings["tenant_id"]
-    client_id = settings["client_id"]
 
     return AuthInfoResponse(
-        tenant_id=tenant_id,
-        client_id=client_id,
-        auth_url=f"https://login.microsoftonline.com/{tenant_id}/oauth2/v2.0/authorize",
-        token_url=f"https://login.microsoftonline.com/{tenant_id}/oauth2/v2.0/token",
+        tenant_id=settings.tenant_id,
+        client_id=settings.client_id,
+        auth_url=settings.auth_url,
+        token_url=settings.token_url,
         scope="openid email profile",
     )
 
@@ -226,7 +508,27 @@ def main():
     print("    Authorization: Bearer <your_microsoft_token>")
     print("")
 
-    uvicorn.run("main:app", host="0.0.0.0", port=5000, reload=True, log_level="info")
+    # uvicorn's default loop/http ("auto") already use uvloop and httptools when
+    # installed (via uvicorn[standard]) and fall back to asyncio and h11 otherwise
+    if os.getenv("ENV", "development").lower() == "production":
+        # WEB_CONCURRENCY overrides the worker count (e.g. to match a container's
+        # CPU quota); reload and multiple workers are mutually exclusive
+        workers = int(os.getenv("WEB_CONCURRENCY", os.process_cpu_count() or 1))
+        uvicorn.run(
+            "main:app",
+            host="0.0.0.0",
+            port=5000,
+            workers=workers,
+            log_level="warning",
+        )
+    else:
+        uvicorn.run(
+            "main:app",
+            host="0.0.0.0",
+            port=5000,
+            reload=True,
+            log_level="info",
+        )
 
 
 if __name__ == "__main__":
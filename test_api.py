@@ -3,17 +3,22 @@
 Test script for the Python Auth Backend FastAPI
 """
 
+import atexit
 import requests
 import json
 
 BASE_URL = "http://localhost:5000"
 
+# Shared session so all tests reuse one keep-alive connection
+_SESSION = requests.Session()
+atexit.register(_SESSION.close)
+
 
 def test_health_endpoint():
     """Test the health check endpoint (no auth required)"""
     print("🔍 Testing /api/health endpoint...")
     try:
-        response = requests.get(f"{BASE_URL}/api/health")
+        response = _SESSION.get(f"{BASE_URL}/api/health")
         print(f"Status Code: {response.status_code}")
         print(f"Response: {response.json()}")
         print("✅ Health endpoint works!\n")
@@ -25,7 +30,7 @@ def test_protected_endpoint_without_token():
     """Test the protected endpoint without token (should return 403)"""
     print("🔍 Testing /api/helloworld without token...")
     try:
-        response = requests.get(f"{BASE_URL}/api/helloworld")
+        response = _SESSION.get(f"{BASE_URL}/api/helloworld")
         print(f"Status Code: {response.status_code}")
         print(f"Response: {response.json()}")
         if response.status_code == 403:
@@ -41,7 +46,7 @@ def test_protected_endpoint_with_invalid_token():
     print("🔍 Testing /api/helloworld with invalid token...")
     try:
         headers = {"Authorization": "Bearer invalid_token_here"}
-        response = requests.get(f"{BASE_URL}/api/helloworld", headers=headers)
+        response = _SESSION.get(f"{BASE_URL}/api/helloworld", headers=headers)
         print(f"Status Code: {response.status_code}")
         print(f"Response: {response.json()}")
         if response.status_code == 401:
@@ -56,7 +61,7 @@ def test_auth_info_endpoint():
     """Test the auth info endpoint"""
     print("🔍 Testing /api/auth/info endpoint...")
     try:
-        response = requests.get(f"{BASE_URL}/api/auth/info")
+        response = _SESSION.get(f"{BASE_URL}/api/auth/info")
         print(f"Status Code: {response.status_code}")
         print(f"Response: {json.dumps(response.json(), indent=2)}")
         print("✅ Auth info endpoint works!\n")
@@ -69,15 +74,15 @@ def test_api_docs():
     print("🔍 Testing FastAPI documentation endpoints...")
     try:
         # Test Swagger UI
-        response = requests.get(f"{BASE_URL}/docs")
+        response = _SESSION.get(f"{BASE_URL}/docs")
         print(f"Swagger UI (/docs): {response.status_code}")
 
         # Test ReDoc
-        response = requests.get(f"{BASE_URL}/redoc")
+        response = _SESSION.get(f"{BASE_URL}/redoc")
         print(f"ReDoc (/redoc): {response.status_code}")
 
         # Test OpenAPI schema
-        response = requests.get(f"{BASE_URL}/openapi.json")
+        response = _SESSION.get(f"{BASE_URL}/openapi.json")
         print(f"OpenAPI Schema (/openapi.json): {response.status_code}")
 
         print("✅ All documentation endpoints work!\n")